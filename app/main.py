@@ -1,11 +1,15 @@
 import os
 import uuid
+import functools
+import mmap
+import threading
+from collections import OrderedDict
 import subprocess
 import re
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Any, Optional, Tuple, Callable, Iterator
 
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, BackgroundTasks
 from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 
@@ -36,26 +40,38 @@ def _limit_upload(size_bytes: int) -> None:
 # Query parser (simple)
 # -------------------------
 
-_TOKEN_RE = re.compile(
-    r"""
-    \s*(
-        \(|\) |
-        (?i:AND|OR|NOT) |
-        [^\s()]+ |
-        "(?:\\.|[^"])*"
-    )
-    """,
-    re.VERBOSE,
-)
-
-
 def _tokenize(q: str) -> List[str]:
-    toks = []
-    for m in _TOKEN_RE.finditer(q):
-        t = m.group(1)
-        if not t:
+    """
+    Splits a query into "(", ")" and whitespace-separated words. A double
+    quoted section (backslash escapes allowed) is kept inside its word, so
+    `query:"evil com"` stays one token.
+    """
+    toks: List[str] = []
+    i = 0
+    n = len(q)
+    while i < n:
+        ch = q[i]
+        if ch.isspace():
+            i += 1
             continue
-        toks.append(t)
+        if ch == "(" or ch == ")":
+            toks.append(ch)
+            i += 1
+            continue
+
+        start = i
+        while i < n:
+            ch = q[i]
+            if ch == '"':
+                i += 1
+                while i < n and q[i] != '"':
+                    i += 2 if q[i] == "\\" else 1
+                i += 1
+            elif ch.isspace() or ch == "(" or ch == ")":
+                break
+            else:
+                i += 1
+        toks.append(q[start:i])
     return toks
 
 
@@ -67,86 +83,117 @@ def _strip_quotes(s: str) -> str:
     return s
 
 
+# Characters that are special in a regex outside a character class. * and ?
+# are left alone so they can be turned into wildcards afterwards.
+_REGEX_META = str.maketrans({c: "\\" + c for c in ".^$+{}[]|()\\"})
+
+
 def _wildcard_to_regex(pat: str) -> str:
     # convert * and ? to regex
-    out = []
-    for ch in pat:
-        if ch == "*":
-            out.append(".*")
-        elif ch == "?":
-            out.append(".")
-        else:
-            out.append(re.escape(ch))
-    return "^" + "".join(out) + "$"
+    esc = pat.translate(_REGEX_META)
+    return "^" + esc.replace("*", ".*").replace("?", ".") + "$"
 
 
-def _match_value(val: str, pat: str) -> bool:
+@functools.lru_cache(maxsize=1024)
+def _wildcard_pattern(pat: str) -> "re.Pattern[str]":
+    return re.compile(_wildcard_to_regex(pat), re.IGNORECASE)
+
+
+def _value_matcher(pat: str) -> Callable[[str], bool]:
+    # compiled once per query term, then reused for every row
     try:
-        rx = re.compile(_wildcard_to_regex(pat), re.IGNORECASE)
-        return rx.search(val) is not None
+        rx = _wildcard_pattern(pat)
     except Exception:
-        return pat.lower() in val.lower()
+        lit = pat.lower()
+        return lambda val: lit in val.lower()
+    search = rx.search
+
+    if "*" not in pat and "?" not in pat and pat.isascii():
+        # No wildcards: the anchored regex is a case-insensitive whole-value
+        # comparison. For ASCII on both sides lower() gives the same answer
+        # as re.IGNORECASE, so skip the regex engine; anything else (e.g. the
+        # Kelvin sign matching "k") is left to the regex.
+        lit = pat.lower()
+        return lambda val: val.lower() == lit if val.isascii() else search(val) is not None
+    return lambda val: search(val) is not None
+
 
+_FIELD_TERM_RE = re.compile(r"^([^:=]+)\s*[:=]\s*(.+)$")
 
-def _term_predicate(term: str):
+
+def _term_predicate(term: str, fields: Tuple[str, ...]):
     term = _strip_quotes(term)
 
     # field:value or field=value
-    m = re.match(r"^([^:=]+)\s*[:=]\s*(.+)$", term)
+    m = _FIELD_TERM_RE.match(term)
     if m:
         field = m.group(1).strip()
-        pat = _strip_quotes(m.group(2).strip())
+        match = _value_matcher(_strip_quotes(m.group(2).strip()))
+
+        if field not in fields:
+            # the column does not exist, so every row sees an empty value
+            const = match("")
+            return lambda row: const
 
-        def _pred(row: Dict[str, str]) -> bool:
-            v = row.get(field, "")
-            return _match_value(v, pat)
+        # last occurrence wins, as it would when building a dict from the row
+        i = len(fields) - 1 - fields[::-1].index(field)
+
+        def _pred(row: List[str]) -> bool:
+            return match(row[i])
 
         return _pred
 
     # bare term -> search across all fields
-    pat = term
+    match = _value_matcher(term)
 
-    def _pred_any(row: Dict[str, str]) -> bool:
-        for v in row.values():
-            if _match_value(v, pat):
+    def _pred_any(row: List[str]) -> bool:
+        for v in row:
+            if match(v):
                 return True
         return False
 
     return _pred_any
 
 
+# Operators by id, with precedence indexed the same way: NOT > AND > OR
+_OPS = ("NOT", "AND", "OR")
+_OP_ID = {"NOT": 0, "AND": 1, "OR": 2}
+_PREC = (3, 2, 1)
+_LPAREN = -1
+
+
 def _to_rpn(tokens: List[str]) -> List[str]:
-    # Shunting-yard: NOT > AND > OR
-    prec = {"NOT": 3, "AND": 2, "OR": 1}
+    # Shunting-yard over integer op ids; the stack holds ids or _LPAREN.
     out: List[str] = []
-    opstack: List[str] = []
-
-    def norm(t: str) -> str:
-        u = t.upper()
-        return u if u in ("AND", "OR", "NOT") else t
+    opstack: List[int] = []
 
     for raw in tokens:
-        t = norm(raw)
-        if t == "(":
-            opstack.append(t)
-        elif t == ")":
-            while opstack and opstack[-1] != "(":
-                out.append(opstack.pop())
-            if opstack and opstack[-1] == "(":
+        if raw == "(":
+            opstack.append(_LPAREN)
+        elif raw == ")":
+            while opstack and opstack[-1] != _LPAREN:
+                out.append(_OPS[opstack.pop()])
+            if opstack:
                 opstack.pop()
-        elif t in ("AND", "OR", "NOT"):
-            while opstack and opstack[-1] in prec and prec[opstack[-1]] >= prec[t]:
-                out.append(opstack.pop())
-            opstack.append(t)
         else:
-            out.append(raw)
+            op = _OP_ID.get(raw.upper(), -1)
+            if op < 0:
+                out.append(raw)
+                continue
+            p = _PREC[op]
+            while opstack and opstack[-1] != _LPAREN and _PREC[opstack[-1]] >= p:
+                out.append(_OPS[opstack.pop()])
+            opstack.append(op)
 
     while opstack:
-        out.append(opstack.pop())
+        op = opstack.pop()
+        out.append("(" if op == _LPAREN else _OPS[op])
     return out
 
 
-def _compile_query(q: str):
+# Paging through results repeats the same query; compile it only once.
+@functools.lru_cache(maxsize=256)
+def _compile_query(q: str, fields: Tuple[str, ...]):
     q = (q or "").strip()
     if not q:
         return None
@@ -156,13 +203,66 @@ def _compile_query(q: str):
         return None
 
     rpn = _to_rpn(toks)
-    preds = []
+
+    # Fold the RPN into a single Python expression over the term predicates
+    # and compile it once, instead of chaining one lambda per operator.
+    # Stack items are (op, parts): op is "and"/"or" for an n-ary group whose
+    # operands are in parts, or None for an atom whose source is parts[0].
+    # Runs of the same operator are flattened, so the expression only nests
+    # as deeply as the query's own grouping, not one level per term.
+    terms = []
+    items: List[Tuple[Optional[str], List[str]]] = []
 
     for tok in rpn:
         u = tok.upper()
         if u == "NOT":
-            if not preds:
+            if not items:
                 # NOT with nothing: treat as always true (no-op)
+                items.append((None, ["True"]))
+                continue
+            items.append((None, ["not " + _render_expr(items.pop())]))
+        elif u in ("AND", "OR"):
+            if len(items) < 2:
+                items.append((None, ["True"]))
+                continue
+            b = items.pop()
+            a = items.pop()
+            op = "and" if u == "AND" else "or"
+            # operands are popped, so their part lists can be reused in place
+            parts = a[1] if a[0] == op else [_render_expr(a)]
+            if b[0] == op:
+                parts.extend(b[1])
+            else:
+                parts.append(_render_expr(b))
+            items.append((op, parts))
+        else:
+            items.append((None, [f"P[{len(terms)}](row)"]))
+            terms.append(_term_predicate(tok, fields))
+
+    if not items:
+        return None
+    try:
+        return eval(f"lambda row: {_render_expr(items[-1])}", {"P": tuple(terms)})
+    except (SyntaxError, RecursionError, MemoryError):
+        # pathologically deep grouping: evaluate through nested closures instead
+        return _closure_chain(rpn, terms)
+
+
+def _render_expr(item: Tuple[Optional[str], List[str]]) -> str:
+    op, parts = item
+    if op is None:
+        return parts[0]
+    return "(" + f" {op} ".join(parts) + ")"
+
+
+def _closure_chain(rpn: List[str], terms: List[Callable]):
+    preds: List[Callable] = []
+    next_term = iter(terms)
+
+    for tok in rpn:
+        u = tok.upper()
+        if u == "NOT":
+            if not preds:
                 preds.append(lambda row: True)
                 continue
             a = preds.pop()
@@ -178,13 +278,158 @@ def _compile_query(q: str):
             else:
                 preds.append(lambda row, a=a, b=b: a(row) or b(row))
         else:
-            preds.append(_term_predicate(tok))
+            preds.append(next(next_term))
 
-    if not preds:
-        return None
     return preds[-1]
 
 
+# -------------------------
+# Log reading
+# -------------------------
+
+# (job_id, log_name, q, mtime_ns, size) -> (total matches, header lines)
+_LOG_TOTALS: "OrderedDict[Tuple[str, str, str, int, int], Tuple[int, List[str]]]" = OrderedDict()
+_LOG_TOTALS_MAX = 256
+_LOG_TOTALS_LOCK = threading.Lock()
+
+LogTotalKey = Tuple[str, str, str, int, int]
+
+# keys with a background count queued or running; guarded by _LOG_TOTALS_LOCK
+_LOG_TOTALS_PENDING: "set[LogTotalKey]" = set()
+
+
+def _cached_total(key: LogTotalKey) -> Optional[Tuple[int, List[str]]]:
+    with _LOG_TOTALS_LOCK:
+        cached = _LOG_TOTALS.get(key)
+        if cached is not None:
+            _LOG_TOTALS.move_to_end(key)
+        return cached
+
+
+def _remember_total(key: LogTotalKey, total: int, header_meta: List[str]) -> None:
+    with _LOG_TOTALS_LOCK:
+        _LOG_TOTALS[key] = (total, header_meta)
+        if len(_LOG_TOTALS) > _LOG_TOTALS_MAX:
+            _LOG_TOTALS.popitem(last=False)
+
+
+def _iter_rows(path: Path, header_meta: List[str]) -> Iterator[Tuple[Optional[List[str]], bytes]]:
+    """
+    Yields (fields, raw_line) for each data line of a memory-mapped log,
+    collecting '#' lines into header_meta as they are passed. Data lines
+    stay undecoded bytes; fields is None for rows seen before any #fields
+    line, which are exposed as a single "_raw" column.
+    """
+    fields: Optional[List[str]] = None
+    with path.open("rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for raw in iter(mm.readline, b""):
+                if raw.endswith(b"\n"):
+                    raw = raw[:-1]
+                if raw.startswith(b"#"):
+                    line = raw.decode("utf-8", errors="replace")
+                    header_meta.append(line)
+                    if line.startswith("#fields"):
+                        parts = line.split("\t")
+                        fields = parts[1:]
+                    continue
+
+                yield fields, raw
+
+
+_RAW_FIELDS = ("_raw",)
+
+
+def _trailing_header(path: Path) -> List[str]:
+    """Returns the '#' lines after the last data line of a log (e.g. #close)."""
+    lines: List[str] = []
+    with path.open("rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return lines
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            end = size - 1 if mm[size - 1] == 0x0A else size
+            while end > 0:
+                start = mm.rfind(b"\n", 0, end) + 1
+                raw = mm[start:end]
+                if not raw.startswith(b"#"):
+                    break
+                lines.append(raw.decode("utf-8", errors="replace"))
+                end = start - 1
+    lines.reverse()
+    return lines
+
+
+def _make_row(fields: Optional[List[str]], raw: bytes) -> List[str]:
+    """Decodes a data line into one value per field, padded or truncated to fit."""
+    line = raw.decode("utf-8", errors="replace")
+    if fields is None:
+        return [line]
+    parts = line.split("\t")
+    if len(parts) < len(fields):
+        parts += [""] * (len(fields) - len(parts))
+    return parts[: len(fields)]
+
+
+def _row_filter(q: str) -> Callable[[Optional[List[str]], bytes], Tuple[bool, Optional[List[str]]]]:
+    """
+    Returns check(fields, raw) -> (hit, row). Term predicates address columns
+    by index, so the query is compiled against the current #fields (the same
+    list object until it changes). row is the decoded row when the filter
+    had to decode it, else None.
+    """
+    compiled = False
+    pred_fields: Optional[List[str]] = None
+    pred = None
+
+    def check(row_fields: Optional[List[str]], raw: bytes) -> Tuple[bool, Optional[List[str]]]:
+        nonlocal compiled, pred_fields, pred
+        if not compiled or row_fields is not pred_fields:
+            compiled = True
+            pred_fields = row_fields
+            pred = _compile_query(q, tuple(row_fields) if row_fields is not None else _RAW_FIELDS)
+        if pred is None:
+            return True, None
+        row = _make_row(row_fields, raw)
+        return bool(pred(row)), row
+
+    return check
+
+
+def _claim_count(key: LogTotalKey) -> bool:
+    """Marks a background count for key as pending; False if one already is."""
+    with _LOG_TOTALS_LOCK:
+        if key in _LOG_TOTALS_PENDING:
+            return False
+        _LOG_TOTALS_PENDING.add(key)
+        return True
+
+
+def _count_matches(path: Path, q: str, key: LogTotalKey) -> None:
+    try:
+        if _cached_total(key) is not None:
+            return
+        header_meta: List[str] = []
+        check = _row_filter(q)
+        total = 0
+        for row_fields, raw in _iter_rows(path, header_meta):
+            if check(row_fields, raw)[0]:
+                total += 1
+        _remember_total(key, total, header_meta)
+    finally:
+        with _LOG_TOTALS_LOCK:
+            _LOG_TOTALS_PENDING.discard(key)
+
+
+def _fields_from_header(header_meta: List[str], saw_rows: bool) -> Optional[List[str]]:
+    for line in reversed(header_meta):
+        if line.startswith("#fields"):
+            return line.split("\t")[1:]
+    return ["_raw"] if saw_rows else None
+
+
 # -------------------------
 # API
 # -------------------------
@@ -249,45 +494,17 @@ async def run_job(
 def get_log(
     job_id: str,
     log_name: str,
+    background_tasks: BackgroundTasks,
     offset: int = 0,
     limit: int = 200,
     q: str = "",
+    count_total: bool = False,
 ) -> JSONResponse:
     job_dir = JOB_ROOT / job_id
     merged_path = job_dir / "merged" / log_name
     if not merged_path.exists():
         raise HTTPException(status_code=404, detail="log not found")
 
-    pred = _compile_query(q)
-
-    fields: Optional[List[str]] = None
-    header_meta: List[str] = []
-    all_rows: List[Dict[str, str]] = []
-
-    with merged_path.open("r", encoding="utf-8", errors="replace") as f:
-        for line in f:
-            line = line.rstrip("\n")
-            if line.startswith("#"):
-                header_meta.append(line)
-                if line.startswith("#fields"):
-                    parts = line.split("\t")
-                    fields = parts[1:]
-                continue
-
-            if fields is None:
-                fields = ["_raw"]
-                row = {"_raw": line}
-            else:
-                parts = line.split("\t")
-                if len(parts) < len(fields):
-                    parts += [""] * (len(fields) - len(parts))
-                parts = parts[: len(fields)]
-                row = {fields[i]: parts[i] for i in range(len(fields))}
-
-            if pred is None or pred(row):
-                all_rows.append(row)
-
-    total = len(all_rows)
     if offset < 0:
         offset = 0
     if limit < 1:
@@ -295,7 +512,54 @@ def get_log(
     if limit > 5000:
         limit = 5000
 
-    page = all_rows[offset: offset + limit]
+    st = merged_path.stat()
+    cache_key = (job_id, log_name, q or "", st.st_mtime_ns, st.st_size)
+    cached = _cached_total(cache_key)
+
+    header_meta: List[str] = []
+    page: List[List[str]] = []
+    matched = 0
+    saw_rows = False
+    stopped_early = False
+
+    check = _row_filter(q)
+    for row_fields, raw in _iter_rows(merged_path, header_meta):
+        saw_rows = True
+        hit, row = check(row_fields, raw)
+        if not hit:
+            continue
+
+        if offset <= matched < offset + limit:
+            page.append(row if row is not None else _make_row(row_fields, raw))
+        matched += 1
+
+        # The total is already known, so stop once the page is full.
+        if cached is not None and matched >= offset + limit:
+            break
+        # Unless the caller asked for an exact count, read only one match past
+        # the page: finding it means there are more rows, while reaching the
+        # end of the log first means the count is exact after all.
+        if cached is None and not count_total and matched > offset + limit:
+            stopped_early = True
+            break
+
+    total: Optional[int]
+    if cached is not None:
+        total, header_meta = cached
+    elif not stopped_early:
+        total = matched
+        _remember_total(cache_key, total, header_meta)
+    else:
+        # Not counted yet: report it as unknown and finish counting after
+        # the response is sent, so later pages of this query get a total.
+        total = None
+        # the scan stopped before any trailing '#' lines such as #close
+        header_meta += _trailing_header(merged_path)
+        if _claim_count(cache_key):
+            background_tasks.add_task(_count_matches, merged_path, q or "", cache_key)
+
+    fields = _fields_from_header(header_meta, saw_rows)
+
     return JSONResponse(
         content={
             "job_id": job_id,
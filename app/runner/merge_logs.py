@@ -1,12 +1,17 @@
 import argparse
+import heapq
+import itertools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
 from pathlib import Path
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional, Iterable
 
 
-def _read_zeek_log(path: Path) -> Tuple[List[str], List[str], List[List[str]]]:
+def _read_zeek_log(path: Path) -> Tuple[List[str], List[str], List[str]]:
     header_lines: List[str] = []
     fields: List[str] = []
-    rows: List[List[str]] = []
+    rows: List[str] = []
 
     with path.open("r", encoding="utf-8", errors="replace") as f:
         for line in f:
@@ -19,7 +24,7 @@ def _read_zeek_log(path: Path) -> Tuple[List[str], List[str], List[List[str]]]:
                 continue
             if not line:
                 continue
-            rows.append(line.split("\t"))
+            rows.append(line)
 
     return header_lines, fields, rows
 
@@ -31,6 +36,52 @@ def _ts_index(fields: List[str]) -> Optional[int]:
         return None
 
 
+def _ts_val(line: str, ts_i: int) -> float:
+    parts = line.split("\t", ts_i + 1)
+    if ts_i >= len(parts):
+        return 0.0
+    try:
+        return float(parts[ts_i])
+    except Exception:
+        return 0.0
+
+
+def _ts_keys(rows: List[str], ts_i: int) -> List[float]:
+    # Fast path: every row has a parseable ts, so no per-row function call.
+    try:
+        return [float(r.split("\t", ts_i + 1)[ts_i]) for r in rows]
+    except (ValueError, IndexError):
+        return [_ts_val(r, ts_i) for r in rows]
+
+
+def _merge_one_log(paths: List[Path], out_path: Path) -> None:
+    first_header, first_fields, first_rows = _read_zeek_log(paths[0])
+    ts_i = _ts_index(first_fields)
+
+    # Best-effort merge even if field sets differ.
+    per_worker = [first_rows] + [_read_zeek_log(p)[2] for p in paths[1:]]
+
+    merged: Iterable[str]
+    if ts_i is None:
+        merged = itertools.chain.from_iterable(per_worker)
+    else:
+        # Sort each worker's rows (already nearly in ts order, so this is
+        # close to linear), then k-way merge them. Both steps are stable, so
+        # the result matches a stable sort of all rows in worker order.
+        keyed = []
+        for rows in per_worker:
+            kr = list(zip(_ts_keys(rows, ts_i), rows))
+            kr.sort(key=itemgetter(0))
+            keyed.append(kr)
+        merged = (r for _, r in heapq.merge(*keyed, key=itemgetter(0)))
+
+    with out_path.open("w", encoding="utf-8") as out:
+        for h in first_header:
+            out.write(h + "\n")
+        for r in merged:
+            out.write(r + "\n")
+
+
 def merge_worker_logs(workers_dir: Path, merged_dir: Path) -> None:
     merged_dir.mkdir(parents=True, exist_ok=True)
 
@@ -42,35 +93,14 @@ def merge_worker_logs(workers_dir: Path, merged_dir: Path) -> None:
         for lp in sorted(logs_dir.glob("*.log")):
             per_log.setdefault(lp.name, []).append(lp)
 
-    for log_name, paths in per_log.items():
-        first_header, first_fields, _ = _read_zeek_log(paths[0])
-        ts_i = _ts_index(first_fields)
-
-        all_rows: List[List[str]] = []
-        for p in paths:
-            _, fields, rows = _read_zeek_log(p)
-            # Best-effort merge even if field sets differ.
-            if fields != first_fields:
-                all_rows.extend(rows)
-            else:
-                all_rows.extend(rows)
-
-        if ts_i is not None:
-            def _ts_val(r: List[str]) -> float:
-                if ts_i >= len(r):
-                    return 0.0
-                try:
-                    return float(r[ts_i])
-                except Exception:
-                    return 0.0
-            all_rows.sort(key=_ts_val)
-
-        out_path = merged_dir / log_name
-        with out_path.open("w", encoding="utf-8") as out:
-            for h in first_header:
-                out.write(h + "\n")
-            for r in all_rows:
-                out.write("\t".join(r) + "\n")
+    # Each log type merges independently of the others.
+    with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as pool:
+        futures = [
+            pool.submit(_merge_one_log, paths, merged_dir / log_name)
+            for log_name, paths in per_log.items()
+        ]
+        for fut in futures:
+            fut.result()
 
 
 def main() -> None:
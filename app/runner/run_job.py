@@ -1,6 +1,8 @@
 import argparse
+import os
 import shutil
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from app.runner.split_pcap import split_pcap_flowhash
@@ -11,9 +13,6 @@ ZEEK_BIN = "/usr/local/zeek/bin/zeek"
 
 
 def run_zeek_on_slice(worker_dir: Path, slice_pcap: Path, script_path: Path) -> None:
-    logs_dir = worker_dir / "logs"
-    logs_dir.mkdir(parents=True, exist_ok=True)
-
     # -C: ignore checksums (common for pcaps captured with NIC checksum offloading)
     cmd = [ZEEK_BIN, "-C", "-r", str(slice_pcap), str(script_path)]
     proc = subprocess.run(cmd, cwd=str(worker_dir), capture_output=True, text=True)
@@ -24,8 +23,14 @@ def run_zeek_on_slice(worker_dir: Path, slice_pcap: Path, script_path: Path) ->
     if proc.returncode != 0:
         raise RuntimeError(f"zeek failed for {worker_dir.name}: {proc.stderr}")
 
+
+def collect_worker_logs(worker_dir: Path) -> None:
+    logs_dir = worker_dir / "logs"
+    logs_dir.mkdir(parents=True, exist_ok=True)
+
+    # same filesystem, so a rename is enough; no copy fallback needed
     for lp in worker_dir.glob("*.log"):
-        shutil.move(str(lp), str(logs_dir / lp.name))
+        os.replace(lp, logs_dir / lp.name)
 
 
 def main() -> None:
@@ -54,15 +59,30 @@ def main() -> None:
     map_path = split_pcap_flowhash(pcap_path, slices_dir, workers)
     print(f"[+] Wrote worker map: {map_path}")
 
-    print("[+] Running Zeek on each slice...")
+    worker_dirs = []
+    slice_pcaps = []
     for i in range(workers):
         worker_dir = workers_dir / f"worker{i+1}"
         if worker_dir.exists():
             shutil.rmtree(worker_dir)
         worker_dir.mkdir(parents=True, exist_ok=True)
-
-        slice_pcap = slices_dir / f"worker{i+1}.pcap"
-        run_zeek_on_slice(worker_dir, slice_pcap, script_path)
+        worker_dirs.append(worker_dir)
+        slice_pcaps.append(slices_dir / f"worker{i+1}.pcap")
+
+    # Each slice is an independent Zeek process; run them side by side,
+    # but never more at once than there are cores to run them on.
+    parallel = max(1, min(workers, os.cpu_count() or 1))
+    print(f"[+] Running Zeek on each slice ({parallel} at a time)...")
+    with ThreadPoolExecutor(max_workers=parallel) as pool:
+        futures = [
+            pool.submit(run_zeek_on_slice, wd, sp, script_path)
+            for wd, sp in zip(worker_dirs, slice_pcaps)
+        ]
+        for fut in futures:
+            fut.result()
+
+    for worker_dir in worker_dirs:
+        collect_worker_logs(worker_dir)
 
     print("[+] Merging worker logs...")
     merge_worker_logs(workers_dir, merged_dir)
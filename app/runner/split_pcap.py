@@ -1,16 +1,36 @@
 import argparse
 import hashlib
+import mmap
+import os
+import struct
+from array import array
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import Tuple, Optional, Dict, Any, List
+from typing import Tuple, Optional, Dict, List, Iterable, Iterator
 
 
 PCAP_GLOBAL_HDR_LEN = 24
 PCAP_PKT_HDR_LEN = 16
 
+# per-worker output is batched and written once this much is pending
+WRITE_BATCH_BYTES = 1 << 20
+
+_INCL_LEN = struct.Struct("<I")
+_ETH_TYPE = struct.Struct("!12xH")
+# ver/ihl, tos, total len, id, frag, ttl, proto, checksum, src, dst
+_IPV4_HDR = struct.Struct("!BBHHHBBH4s4s")
+# ver/class/flow, payload len, next header, hop limit, src, dst
+_IPV6_HDR = struct.Struct("!IHBB16s16s")
+_L4_PORTS = struct.Struct("!HH")
+_KEY_TAIL = struct.Struct("!HHB")
+
 
 def _hash_key(key: bytes) -> int:
-    h = hashlib.sha1(key).digest()
-    return int.from_bytes(h[:8], byteorder="big", signed=False)
+    # Only used to spread flows across workers, so no need for a cryptographic
+    # digest; a 64-bit BLAKE2b is much cheaper than SHA-1 and stays deterministic.
+    h = hashlib.blake2b(key, digest_size=8).digest()
+    return int.from_bytes(h, byteorder="big", signed=False)
 
 
 def _fmt_ipv4(ip4: bytes) -> str:
@@ -24,46 +44,47 @@ def _fmt_ipv6(ip6: bytes) -> str:
     return ":".join(parts)
 
 
+def _fmt_ip(ip_ver: int, ip: bytes) -> str:
+    if ip_ver == 4:
+        return _fmt_ipv4(ip)
+    if ip_ver == 6:
+        return _fmt_ipv6(ip)
+    return "-"
+
+
 def _canon_endpoints(ip_a: bytes, port_a: int, ip_b: bytes, port_b: int) -> Tuple[bytes, int, bytes, int]:
     """
     Canonicalize endpoints so the flow hash is direction-symmetric.
     This emulates AF_PACKET-style symmetric flow hashing: both directions
     of the same 5-tuple map to the same worker.
     """
-    a = ip_a + port_a.to_bytes(2, "big", signed=False)
-    b = ip_b + port_b.to_bytes(2, "big", signed=False)
-    if a <= b:
+    # Same ordering as comparing ip + big-endian port bytes, without building them.
+    if (ip_a, port_a) <= (ip_b, port_b):
         return ip_a, port_a, ip_b, port_b
     return ip_b, port_b, ip_a, port_a
 
 
-def _ipv4_tuple(pkt: bytes) -> Optional[Tuple[bytes, bytes, int, int, int]]:
+ETH_TYPE_IPV4 = 0x0800
+ETH_TYPE_IPV6 = 0x86DD
+
+
+def _ipv4_tuple(pkt: memoryview) -> Optional[Tuple[bytes, bytes, int, int, int]]:
+    # caller has already checked the Ethernet type
     if len(pkt) < 14 + 20:
         return None
-    eth_type = int.from_bytes(pkt[12:14], "big")
-    if eth_type != 0x0800:
-        return None
-
-    ip = pkt[14:]
-    ver_ihl = ip[0]
+    ver_ihl, _, _, _, _, _, proto, _, src_ip, dst_ip = _IPV4_HDR.unpack_from(pkt, 14)
     ver = ver_ihl >> 4
     if ver != 4:
         return None
 
     ihl = (ver_ihl & 0x0F) * 4
-    if len(ip) < ihl:
+    if len(pkt) < 14 + ihl:
         return None
 
-    proto = ip[9]
-    src_ip = ip[12:16]
-    dst_ip = ip[16:20]
-
     if proto in (6, 17):
-        if len(ip) < ihl + 4:
+        if len(pkt) < 14 + ihl + 4:
             return None
-        l4 = ip[ihl:]
-        src_port = int.from_bytes(l4[0:2], "big")
-        dst_port = int.from_bytes(l4[2:4], "big")
+        src_port, dst_port = _L4_PORTS.unpack_from(pkt, 14 + ihl)
     else:
         src_port = 0
         dst_port = 0
@@ -71,29 +92,21 @@ def _ipv4_tuple(pkt: bytes) -> Optional[Tuple[bytes, bytes, int, int, int]]:
     return (src_ip, dst_ip, src_port, dst_port, proto)
 
 
-def _ipv6_tuple(pkt: bytes) -> Optional[Tuple[bytes, bytes, int, int, int]]:
+def _ipv6_tuple(pkt: memoryview) -> Optional[Tuple[bytes, bytes, int, int, int]]:
+    # caller has already checked the Ethernet type
     if len(pkt) < 14 + 40:
         return None
-    eth_type = int.from_bytes(pkt[12:14], "big")
-    if eth_type != 0x86DD:
-        return None
-
-    ip = pkt[14:]
-    ver = ip[0] >> 4
+    vtf, _, nxt, _, src_ip, dst_ip = _IPV6_HDR.unpack_from(pkt, 14)
+    ver = vtf >> 28
     if ver != 6:
         return None
 
-    nxt = ip[6]
-    src_ip = ip[8:24]
-    dst_ip = ip[24:40]
     proto = nxt
 
     if proto in (6, 17):
-        if len(ip) < 40 + 4:
+        if len(pkt) < 14 + 40 + 4:
             return None
-        l4 = ip[40:]
-        src_port = int.from_bytes(l4[0:2], "big")
-        dst_port = int.from_bytes(l4[2:4], "big")
+        src_port, dst_port = _L4_PORTS.unpack_from(pkt, 14 + 40)
     else:
         src_port = 0
         dst_port = 0
@@ -101,78 +114,47 @@ def _ipv6_tuple(pkt: bytes) -> Optional[Tuple[bytes, bytes, int, int, int]]:
     return (src_ip, dst_ip, src_port, dst_port, proto)
 
 
-def tuple_for_packet(pkt: bytes) -> Tuple[bytes, Dict[str, Any]]:
+def tuple_for_packet(pkt: memoryview) -> Tuple[bytes, bytes, bytes, int, int, int, int]:
     """
-    Returns (hash_key_bytes, representation_dict).
+    Returns (hash_key_bytes, src_ip, dst_ip, src_port, dst_port, proto, ip_ver).
 
     IMPORTANT:
     - hash_key_bytes is direction-symmetric for TCP/UDP (proto 6/17) by
       canonicalizing (ip,port) endpoints.
-    - representation_dict preserves the original observed direction for
-      display in worker_map.log (we keep your existing fields/format).
+    - the remaining fields preserve the original observed direction for
+      display in worker_map.log. Addresses are raw bytes; formatting them
+      is left to the caller (see _fmt_ip) since only a flow's first packet
+      needs it. Non-IP frames get ip_ver 0 and empty addresses.
     """
-    t4 = _ipv4_tuple(pkt)
+    eth_type = _ETH_TYPE.unpack_from(pkt, 0)[0] if len(pkt) >= 14 else 0
+
+    t4 = _ipv4_tuple(pkt) if eth_type == ETH_TYPE_IPV4 else None
     if t4 is not None:
         src_ip_b, dst_ip_b, sp, dp, pr = t4
 
         # symmetric key
         ca_ip, ca_p, cb_ip, cb_p = _canon_endpoints(src_ip_b, sp, dst_ip_b, dp)
-        key = (
-            b"4"
-            + ca_ip
-            + cb_ip
-            + ca_p.to_bytes(2, "big")
-            + cb_p.to_bytes(2, "big")
-            + bytes([pr])
-        )
-
-        # preserve original direction for display
-        return key, {
-            "ip_ver": 4,
-            "src_ip": _fmt_ipv4(src_ip_b),
-            "dst_ip": _fmt_ipv4(dst_ip_b),
-            "src_port": sp,
-            "dst_port": dp,
-            "proto": pr,
-        }
-
-    t6 = _ipv6_tuple(pkt)
+        key = b"4" + ca_ip + cb_ip + _KEY_TAIL.pack(ca_p, cb_p, pr)
+        return key, src_ip_b, dst_ip_b, sp, dp, pr, 4
+
+    t6 = _ipv6_tuple(pkt) if eth_type == ETH_TYPE_IPV6 else None
     if t6 is not None:
         src_ip_b, dst_ip_b, sp, dp, pr = t6
 
         # symmetric key
         ca_ip, ca_p, cb_ip, cb_p = _canon_endpoints(src_ip_b, sp, dst_ip_b, dp)
-        key = (
-            b"6"
-            + ca_ip
-            + cb_ip
-            + ca_p.to_bytes(2, "big")
-            + cb_p.to_bytes(2, "big")
-            + bytes([pr])
-        )
-
-        # preserve original direction for display
-        return key, {
-            "ip_ver": 6,
-            "src_ip": _fmt_ipv6(src_ip_b),
-            "dst_ip": _fmt_ipv6(dst_ip_b),
-            "src_port": sp,
-            "dst_port": dp,
-            "proto": pr,
-        }
-
-    key = b"X" + pkt[:64]
-    return key, {
-        "ip_ver": 0,
-        "src_ip": "-",
-        "dst_ip": "-",
-        "src_port": 0,
-        "dst_port": 0,
-        "proto": 0,
-    }
-
-
-def write_worker_map_log(out_path: Path, rows: List[Dict[str, Any]]) -> None:
+        key = b"6" + ca_ip + cb_ip + _KEY_TAIL.pack(ca_p, cb_p, pr)
+        return key, src_ip_b, dst_ip_b, sp, dp, pr, 6
+
+    key = b"X" + bytes(pkt[:64])
+    return key, b"", b"", 0, 0, 0, 0
+
+
+def write_worker_map_log(out_path: Path, rows: Iterable[Tuple[int, int, str, int, str, int, int, int]]) -> None:
+    """
+    rows are (worker, ip_ver, src_ip, src_port, dst_ip, dst_port, proto,
+    pkt_count) tuples, in field order; they are written as they are consumed.
+    """
     fields = ["worker", "ip_ver", "src_ip", "src_port", "dst_ip", "dst_port", "proto", "pkt_count"]
     types = ["count", "count", "string", "port", "string", "port", "count", "count"]
 
@@ -187,84 +169,182 @@ def write_worker_map_log(out_path: Path, rows: List[Dict[str, Any]]) -> None:
         f.write("#types\t" + "\t".join(types) + "\n")
 
         for r in rows:
-            line = [
-                str(r["worker"]),
-                str(r["ip_ver"]),
-                str(r["src_ip"]),
-                str(r["src_port"]),
-                str(r["dst_ip"]),
-                str(r["dst_port"]),
-                str(r["proto"]),
-                str(r["pkt_count"]),
-            ]
-            f.write("\t".join(line) + "\n")
+            f.write("\t".join(map(str, r)) + "\n")
 
         f.write("#close 0\n")
 
 
+def _write_all(fd: int, buf: bytearray) -> None:
+    with memoryview(buf) as mv:
+        done = 0
+        while done < len(mv):
+            done += os.write(fd, mv[done:])
+    buf.clear()
+
+
+class _BackgroundWriter:
+    """
+    Writes filled slice buffers on a single background thread so parsing
+    continues while the kernel copies data out. One thread keeps writes to
+    each fd in submission order; at most max_pending buffers are in flight.
+    """
+
+    def __init__(self, max_pending: int = 8) -> None:
+        self._pool = ThreadPoolExecutor(max_workers=1)
+        self._pending: "deque[Future]" = deque()
+        self._max_pending = max_pending
+
+    def submit(self, fd: int, buf: bytearray) -> None:
+        if len(self._pending) >= self._max_pending:
+            self._pending.popleft().result()
+        self._pending.append(self._pool.submit(_write_all, fd, buf))
+
+    def close(self) -> None:
+        try:
+            while self._pending:
+                self._pending.popleft().result()
+        finally:
+            self._pool.shutdown()
+
+
+class _FlowTable:
+    """
+    Per-flow state kept as parallel arrays indexed by a compact flow id,
+    rather than one dict per flow. No per-flow row is materialized; the
+    worker_map.log rows are produced one at a time by map_rows().
+    """
+
+    def __init__(self) -> None:
+        self.ids: Dict[bytes, int] = {}
+        self.workers = array("I")
+        self.pkt_counts = array("Q")
+        # (ip_ver, src_ip, dst_ip, src_port, dst_port, proto), as first observed
+        self.reps: List[Tuple[int, str, str, int, int, int]] = []
+
+    def map_rows(self) -> Iterator[Tuple[int, int, str, int, str, int, int, int]]:
+        """
+        Yields worker_map.log rows ordered by worker, then busiest flow first.
+        Only flow ids are sorted; each row tuple is built as it is written.
+        """
+        workers = self.workers
+        pkt_counts = self.pkt_counts
+        reps = self.reps
+
+        def _order(fid: int) -> Tuple[int, int, int, str, str, int]:
+            ip_ver, src_ip, dst_ip, _, _, pr = reps[fid]
+            return (workers[fid], -pkt_counts[fid], ip_ver, src_ip, dst_ip, pr)
+
+        for fid in sorted(range(len(pkt_counts)), key=_order):
+            ip_ver, src_ip, dst_ip, sp, dp, pr = reps[fid]
+            yield (workers[fid], ip_ver, src_ip, sp, dst_ip, dp, pr, pkt_counts[fid])
+
+
+def _split_packets(
+    data: memoryview,
+    outs: List[Tuple[Path, int, bytearray]],
+    flows: _FlowTable,
+    workers: int,
+    writer: _BackgroundWriter,
+) -> None:
+    global_hdr = data[:PCAP_GLOBAL_HDR_LEN]
+    for _, _, buf in outs:
+        buf += global_hdr
+
+    flow_ids = flows.ids
+    flow_workers = flows.workers
+    pkt_counts = flows.pkt_counts
+    reps = flows.reps
+
+    # Global lookups hoisted into locals for the per-packet loop.
+    unpack_incl_len = _INCL_LEN.unpack_from
+    parse = tuple_for_packet
+    batch_bytes = WRITE_BATCH_BYTES
+
+    size = len(data)
+    off = PCAP_GLOBAL_HDR_LEN
+    while off + PCAP_PKT_HDR_LEN <= size:
+        incl_len = unpack_incl_len(data, off + 8)[0]
+        pkt_off = off + PCAP_PKT_HDR_LEN
+        pkt_end = pkt_off + incl_len
+        if pkt_end > size:
+            break
+
+        key, src_ip_b, dst_ip_b, sp, dp, pr, ip_ver = parse(data[pkt_off:pkt_end])
+
+        fid = flow_ids.get(key)
+        if fid is None:
+            idx = _hash_key(key) % workers
+            fid = len(pkt_counts)
+            flow_ids[key] = fid
+            flow_workers.append(idx + 1)
+            pkt_counts.append(1)
+            # display strings are only built for a flow's first packet
+            reps.append((ip_ver, _fmt_ip(ip_ver, src_ip_b), _fmt_ip(ip_ver, dst_ip_b), sp, dp, pr))
+        else:
+            # a known flow keeps its worker; no need to hash it again
+            idx = flow_workers[fid] - 1
+            pkt_counts[fid] += 1
+
+        # record header and packet data are contiguous in the source capture
+        p, fd, buf = outs[idx]
+        buf += data[off:pkt_end]
+        if len(buf) >= batch_bytes:
+            writer.submit(fd, buf)
+            outs[idx] = (p, fd, bytearray())
+
+        off = pkt_end
+
+
 def split_pcap_flowhash(pcap_path: Path, out_dir: Path, workers: int) -> Path:
     out_dir.mkdir(parents=True, exist_ok=True)
     outs = []
     for i in range(workers):
         p = out_dir / f"worker{i+1}.pcap"
-        f = p.open("wb")
-        outs.append((p, f))
+        fd = os.open(str(p), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        outs.append((p, fd, bytearray()))
 
-    flow_map: Dict[bytes, Dict[str, Any]] = {}
+    flows = _FlowTable()
+    writer = _BackgroundWriter()
 
     try:
-        data = pcap_path.read_bytes()
-        if len(data) < PCAP_GLOBAL_HDR_LEN:
-            raise ValueError("pcap too small")
-
-        global_hdr = data[:PCAP_GLOBAL_HDR_LEN]
-        for _, f in outs:
-            f.write(global_hdr)
-
-        off = PCAP_GLOBAL_HDR_LEN
-        while off + PCAP_PKT_HDR_LEN <= len(data):
-            pkt_hdr = data[off : off + PCAP_PKT_HDR_LEN]
-            incl_len = int.from_bytes(pkt_hdr[8:12], "little")
-            pkt_off = off + PCAP_PKT_HDR_LEN
-            pkt_end = pkt_off + incl_len
-            if pkt_end > len(data):
-                break
-
-            pkt = data[pkt_off:pkt_end]
-            key, rep = tuple_for_packet(pkt)
-
-            idx = _hash_key(key) % workers
-            worker_id = idx + 1
-
-            _, f = outs[idx]
-            f.write(pkt_hdr)
-            f.write(pkt)
-
-            if key not in flow_map:
-                flow_map[key] = {
-                    "worker": worker_id,
-                    "ip_ver": rep["ip_ver"],
-                    "src_ip": rep["src_ip"],
-                    "dst_ip": rep["dst_ip"],
-                    "src_port": rep["src_port"],
-                    "dst_port": rep["dst_port"],
-                    "proto": rep["proto"],
-                    "pkt_count": 1,
-                }
-            else:
-                flow_map[key]["pkt_count"] += 1
-
-            off = pkt_end
+        with pcap_path.open("rb") as src:
+            size = os.fstat(src.fileno()).st_size
+            if size < PCAP_GLOBAL_HDR_LEN:
+                raise ValueError("pcap too small")
+
+            # Map the capture instead of reading it into memory; packets are
+            # handed around as zero-copy memoryview slices of the mapping.
+            mm = mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                with memoryview(mm) as data:
+                    _split_packets(data, outs, flows, workers, writer)
+            except BaseException:
+                # The traceback still references packet slices of the mapping,
+                # so it cannot be closed yet. Leave it to be freed with them
+                # rather than replace the real error with a BufferError.
+                try:
+                    mm.close()
+                except BufferError:
+                    pass
+                raise
+            mm.close()
 
     finally:
-        for _, f in outs:
-            f.close()
-
-    rows = list(flow_map.values())
-    rows.sort(key=lambda r: (r["worker"], -int(r["pkt_count"]), r["ip_ver"], r["src_ip"], r["dst_ip"], r["proto"]))
+        try:
+            try:
+                for _, fd, buf in outs:
+                    writer.submit(fd, buf)
+            finally:
+                writer.close()
+        finally:
+            for _, fd, _ in outs:
+                os.close(fd)
+
+    # the key -> id index is only needed while packets are being assigned
+    flows.ids.clear()
 
     map_path = out_dir / "worker_map.log"
-    write_worker_map_log(map_path, rows)
+    write_worker_map_log(map_path, flows.map_rows())
     return map_path
 
 
@@ -2,7 +2,8 @@ let currentJobId = null;
 let currentLog = null;
 let currentOffset = 0;
 let currentLimit = 200;
-let currentTotal = 0;
+let currentTotal = 0;      // null when the server only knows there are more matches
+let currentRowCount = 0;
 let currentQuery = "";
 let aceEditor = null;
 let isRunning = false;
@@ -58,9 +59,9 @@ function buildTable(fields, rows) {
   const tbody = document.createElement("tbody");
   rows.forEach(r => {
     const tr = document.createElement("tr");
-    fields.forEach(f => {
+    fields.forEach((f, i) => {
       const td = document.createElement("td");
-      const v = (r[f] !== undefined && r[f] !== null) ? String(r[f]) : "";
+      const v = (r[i] !== undefined && r[i] !== null) ? String(r[i]) : "";
       td.textContent = v;
       td.title = v;
       tr.appendChild(td);
@@ -74,12 +75,20 @@ function renderPager() {
   const p = el("pager");
   p.innerHTML = "";
 
-  const start = currentTotal === 0 ? 0 : Math.min(currentTotal, currentOffset + 1);
-  const end = Math.min(currentTotal, currentOffset + currentLimit);
+  const known = currentTotal !== null;
+  let start, end;
+  if (known) {
+    start = currentTotal === 0 ? 0 : Math.min(currentTotal, currentOffset + 1);
+    end = Math.min(currentTotal, currentOffset + currentLimit);
+  } else {
+    start = currentRowCount === 0 ? 0 : currentOffset + 1;
+    end = currentOffset + currentRowCount;
+  }
 
   const info = document.createElement("div");
   const jobPart = currentJobId ? `Job ${currentJobId}` : "No job";
-  info.textContent = `${jobPart} — Showing ${start}–${end} of ${currentTotal}` + (currentQuery ? ` (filtered)` : "");
+  const totalPart = known ? String(currentTotal) : `more than ${end} (total unknown)`;
+  info.textContent = `${jobPart} — Showing ${start}–${end} of ${totalPart}` + (currentQuery ? ` (filtered)` : "");
   p.appendChild(info);
 
   const prev = document.createElement("button");
@@ -93,9 +102,10 @@ function renderPager() {
 
   const next = document.createElement("button");
   next.textContent = "Next";
-  next.disabled = (currentOffset + currentLimit >= currentTotal);
+  // an unknown total means the server saw at least one match past this page
+  next.disabled = known ? (currentOffset + currentLimit >= currentTotal) : false;
   next.addEventListener("click", () => {
-    currentOffset = Math.min(currentTotal, currentOffset + currentLimit);
+    currentOffset = known ? Math.min(currentTotal, currentOffset + currentLimit) : currentOffset + currentLimit;
     fetchLogPage();
   });
   p.appendChild(next);
@@ -115,7 +125,8 @@ async function fetchLogPage() {
   }
 
   const data = await res.json();
-  currentTotal = data.total || 0;
+  currentTotal = (data.total === null || data.total === undefined) ? null : data.total;
+  currentRowCount = (data.rows || []).length;
   buildTable(data.fields || [], data.rows || []);
   renderPager();
   setStatus(`Loaded ${currentLog}.`);